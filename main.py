@@ -14,22 +14,38 @@ Environment variables:
 Notes: Automation relies on Win32 APIs; best-effort only. Window structure may change.
 """
 
-import os, sys, socket, re, time, threading, datetime, platform
-from typing import Set, Optional
+import os, sys, socket, re, time, threading, datetime, platform, subprocess, functools
+from collections import OrderedDict
+from queue import Queue
+from typing import Optional
 
 HOST = 'irc.chat.twitch.tv'
 PORT = 6667
+RECV_SIZE = 65536
+COMPACT_THRESHOLD = 32768  # consumed bytes kept in the receive buffer before compacting
 
 NICK = os.getenv('TWITCH_NICK', '').strip()
 TOKEN = os.getenv('TWITCH_OAUTH', '').strip()
 CHANNEL_RAW = os.getenv('TWITCH_CHANNEL', '').strip()
 CHANNEL = f"#{CHANNEL_RAW}" if CHANNEL_RAW and not CHANNEL_RAW.startswith('#') else CHANNEL_RAW
 
-CODE_PATTERN = os.getenv('CODE_REGEX', r"\b[A-Z0-9]{4}(?:-[A-Z0-9]{4}){3}\b")
+DEFAULT_CODE_PATTERN = r"\b[A-Z0-9]{4}(?:-[A-Z0-9]{4}){3}\b"
+CODE_PATTERN = os.getenv('CODE_REGEX', DEFAULT_CODE_PATTERN)
+# Default codes always carry three hyphens; a custom pattern may not, so only
+# prefilter on hyphen count when the default is in use.
+PREFILTER_HYPHENS = CODE_PATTERN == DEFAULT_CODE_PATTERN
 AUTO_REDEEM = os.getenv('AUTO_REDEEM') == '1'
 EA_PID_ENV = os.getenv('EA_PID')  # If absent we will attempt auto-detect by process name
 SEND_ENTER = os.getenv('REDEEM_SEND_ENTER') == '1'
 DISABLE_CLIPBOARD = os.getenv('DISABLE_CLIPBOARD') == '1'
+DISABLE_BEEP = os.getenv('DISABLE_BEEP') == '1'
+
+# Resolved once at import; these are consulted on every detected code.
+_SYSTEM = platform.system()
+_IS_WINDOWS = _SYSTEM == 'Windows'
+_IS_MAC = _SYSTEM == 'Darwin'
+_IS_LINUX = _SYSTEM == 'Linux'
+_UTCNOW = datetime.datetime.utcnow
 
 if not (NICK and TOKEN and CHANNEL):
     print('Missing required env vars TWITCH_NICK, TWITCH_OAUTH, TWITCH_CHANNEL.')
@@ -47,25 +63,129 @@ except ValueError:
     EA_PID = None
     print('EA_PID env invalid (not an int); will attempt auto-detect if enabled.')
 
-code_regex = re.compile(CODE_PATTERN)
-seen_codes: Set[str] = set()
+# Optional Windows bindings, imported once here rather than on every detected code.
+_user32 = _kernel32 = _message_beep = None
+win32gui = win32con = None
+send_keys = None
+if _IS_WINDOWS:
+    try:
+        import ctypes
+        from ctypes import wintypes
+        _user32 = ctypes.windll.user32
+        _kernel32 = ctypes.windll.kernel32
+        WNDENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        _user32.EnumWindows.argtypes = [WNDENUMPROC, wintypes.LPARAM]
+        _user32.IsWindowVisible.argtypes = [wintypes.HWND]
+        _user32.GetWindowThreadProcessId.restype = wintypes.DWORD
+        _user32.GetWindowThreadProcessId.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+        # Pointer-sized handles must not go through ctypes' default 32-bit int.
+        _kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+        _kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        _kernel32.GlobalLock.restype = wintypes.LPVOID
+        _kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        _kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+        _kernel32.GlobalFree.restype = wintypes.HGLOBAL
+        _kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+        _user32.OpenClipboard.argtypes = [wintypes.HWND]
+        _user32.SetClipboardData.restype = wintypes.HANDLE
+        _user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+
+        class PROCESSENTRY32W(ctypes.Structure):
+            _fields_ = [
+                ('dwSize', wintypes.DWORD),
+                ('cntUsage', wintypes.DWORD),
+                ('th32ProcessID', wintypes.DWORD),
+                ('th32DefaultHeapID', ctypes.c_size_t),
+                ('th32ModuleID', wintypes.DWORD),
+                ('cntThreads', wintypes.DWORD),
+                ('th32ParentProcessID', wintypes.DWORD),
+                ('pcPriClassBase', wintypes.LONG),
+                ('dwFlags', wintypes.DWORD),
+                ('szExeFile', wintypes.WCHAR * 260),
+            ]
+
+        _kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        _kernel32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+        _kernel32.Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+        _kernel32.Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+        _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    except Exception:
+        _user32 = _kernel32 = None
+    try:
+        import winsound
+        _message_beep = winsound.MessageBeep
+    except ImportError:
+        pass
+    if AUTO_REDEEM:
+        try:
+            import win32gui, win32con  # type: ignore
+        except ImportError:
+            print('[auto] pywin32 not installed; auto redeem will be skipped.')
+        try:
+            from pywinauto.keyboard import send_keys  # type: ignore
+        except ImportError:
+            print('[auto] pywinauto not installed; auto redeem cannot send keys.')
+
+# Match case-insensitively so only the matched code is uppercased, not the whole line.
+code_regex = re.compile(CODE_PATTERN, re.IGNORECASE)
+# Insertion-ordered so the oldest code can be evicted once the cap is reached.
+MAX_SEEN_CODES = 10_000
+seen_codes: 'OrderedDict[str, None]' = OrderedDict()
 lock = threading.Lock()
+# Codes waiting for auto redeem; drained by a worker so typing never blocks IRC.
+redeem_queue: 'Queue[str]' = Queue()
 
 def timestamp() -> str:
-    return datetime.datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+    return _UTCNOW().isoformat(timespec='milliseconds') + 'Z'
 
 def beep():
-    if platform.system() == 'Windows' and os.getenv('DISABLE_BEEP') != '1':
+    if _message_beep is not None and not DISABLE_BEEP:
         try:
-            import winsound
-            winsound.MessageBeep()
+            _message_beep()
         except Exception:
             pass
 
-def copy_to_clipboard(text: str):
-    if DISABLE_CLIPBOARD:
+def _copy_win32(text: str) -> bool:
+    CF_UNICODETEXT = 13
+    GMEM_MOVEABLE = 0x0002
+    try:
+        if not _user32.OpenClipboard(None):
+            return False
+        try:
+            _user32.EmptyClipboard()
+            # Allocate global memory for the text
+            data = text + '\0'
+            size = (len(data)) * 2
+            hGlobal = _kernel32.GlobalAlloc(GMEM_MOVEABLE, size)
+            if not hGlobal:
+                return False
+            locked = _kernel32.GlobalLock(hGlobal)
+            if not locked:
+                _kernel32.GlobalFree(hGlobal)
+                return False
+            ctypes.memmove(locked, ctypes.create_unicode_buffer(data), size)
+            _kernel32.GlobalUnlock(hGlobal)
+            if not _user32.SetClipboardData(CF_UNICODETEXT, hGlobal):
+                # Ownership only passes to the system on success.
+                _kernel32.GlobalFree(hGlobal)
+                return False
+            return True
+        finally:
+            _user32.CloseClipboard()
+    except Exception:
+        return False
+
+def _copy_command(cmd, text: str) -> bool:
+    """Pipe text into a clipboard CLI (pbcopy / xclip / xsel)."""
+    try:
+        p = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        p.communicate(text.encode('utf-8'))
+        return p.returncode == 0
+    except Exception:
         return False
-    # Try tkinter (stdlib)
+
+def _copy_tkinter(text: str) -> bool:
+    """Last resort: spins up a hidden Tk interpreter per call."""
     try:
         import tkinter as tk  # type: ignore
         r = tk.Tk()
@@ -76,67 +196,75 @@ def copy_to_clipboard(text: str):
         r.destroy()
         return True
     except Exception:
-        pass
-    # Windows: Win32 API
-    if platform.system() == 'Windows':
-        try:
-            import ctypes
-            CF_UNICODETEXT = 13
-            user32 = ctypes.windll.user32
-            kernel32 = ctypes.windll.kernel32
-            if user32.OpenClipboard(None):
-                try:
-                    user32.EmptyClipboard()
-                    # Allocate global memory for the text
-                    data = text + '\0'
-                    size = (len(data)) * 2
-                    GMEM_MOVEABLE = 0x0002
-                    hGlobal = kernel32.GlobalAlloc(GMEM_MOVEABLE, size)
-                    locked = kernel32.GlobalLock(hGlobal)
-                    ctypes.memmove(locked, ctypes.create_unicode_buffer(data), size)
-                    kernel32.GlobalUnlock(hGlobal)
-                    user32.SetClipboardData(CF_UNICODETEXT, hGlobal)
-                    return True
-                finally:
-                    user32.CloseClipboard()
-        except Exception:
-            pass
-    # macOS pbcopy
-    if platform.system() == 'Darwin':
-        import subprocess
-        try:
-            p = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE)
-            p.communicate(text.encode('utf-8'))
-            return p.returncode == 0
-        except Exception:
-            pass
-    # Linux xclip / xsel
-    if platform.system() == 'Linux':
-        import subprocess
-        for cmd in (['xclip','-selection','clipboard'], ['xsel','--clipboard','--input']):
-            try:
-                p = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-                p.communicate(text.encode('utf-8'))
-                if p.returncode == 0:
-                    return True
-            except Exception:
-                continue
+        return False
+
+# Native backend for this platform first, tkinter only as a fallback.
+_CLIPBOARD_BACKENDS = []
+if _user32 is not None:
+    _CLIPBOARD_BACKENDS.append(_copy_win32)
+if _IS_MAC:
+    _CLIPBOARD_BACKENDS.append(functools.partial(_copy_command, ['pbcopy']))
+if _IS_LINUX:
+    for _cmd in (['xclip','-selection','clipboard'], ['xsel','--clipboard','--input']):
+        _CLIPBOARD_BACKENDS.append(functools.partial(_copy_command, _cmd))
+_CLIPBOARD_BACKENDS.append(_copy_tkinter)
+_copy_backend = None  # first native backend that succeeded; tried first on later calls
+
+def copy_to_clipboard(text: str):
+    global _copy_backend
+    if DISABLE_CLIPBOARD:
+        return False
+    if _copy_backend is not None and _copy_backend(text):
+        return True
+    for backend in _CLIPBOARD_BACKENDS:
+        if backend is not _copy_backend and backend(text):
+            # Never pin tkinter: a transient native failure would make every
+            # later copy start with the hidden Tk round-trip.
+            if backend is not _copy_tkinter:
+                _copy_backend = backend
+            return True
     return False
 
+def _detect_pid_win32() -> Optional[int]:
+    """Walk a Toolhelp process snapshot and return the first EADesktop.exe PID."""
+    TH32CS_SNAPPROCESS = 0x00000002
+    INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+    snap = _kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if not snap or snap == INVALID_HANDLE_VALUE:
+        raise OSError('CreateToolhelp32Snapshot failed')
+    try:
+        entry = PROCESSENTRY32W()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+        ok = _kernel32.Process32FirstW(snap, ctypes.byref(entry))
+        while ok:
+            if entry.szExeFile.lower() == 'eadesktop.exe':
+                return entry.th32ProcessID
+            ok = _kernel32.Process32NextW(snap, ctypes.byref(entry))
+        return None
+    finally:
+        _kernel32.CloseHandle(snap)
+
 def auto_detect_pid() -> Optional[int]:
-    """Attempt to locate EADesktop.exe PID if not supplied."""
+    """Attempt to locate EADesktop.exe PID if not supplied.
+
+    Uses a native Toolhelp snapshot on Windows, falling back to psutil.
+    """
+    if _kernel32 is not None:
+        try:
+            return _detect_pid_win32()
+        except Exception:
+            pass
     try:
         import psutil  # type: ignore
     except ImportError:
         return None
-    candidates = []
     for p in psutil.process_iter(['pid', 'name']):
         try:
             if p.info.get('name') and p.info['name'].lower() == 'eadesktop.exe':
-                candidates.append(p.info['pid'])
+                return p.info['pid']
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             continue
-    return candidates[0] if candidates else None
+    return None
 
 def focus_and_type(code: str):
     """Attempt to focus EA Desktop window (by PID) and type code. Best-effort.
@@ -151,29 +279,26 @@ def focus_and_type(code: str):
         else:
             print('[auto] Could not auto-detect EA Desktop PID.')
             return
-    if platform.system() != 'Windows':
+    if not _IS_WINDOWS:
         print('[auto] Non-Windows OS; skipping auto redeem.')
         return
-    try:
-        import win32gui, win32con, win32process
-    except ImportError:
-        print('[auto] pywin32 not installed; skipping.')
+    if _user32 is None or win32gui is None or send_keys is None:
+        # Missing pywin32/pywinauto was reported once at startup.
         return
     target_hwnd = None
+    pid = wintypes.DWORD()
     def enum_handler(hwnd, _):
         nonlocal target_hwnd
-        if not win32gui.IsWindowVisible(hwnd):
-            return
-        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        if pid == EA_PID:
+        if not _user32.IsWindowVisible(hwnd):
+            return True
+        _user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if pid.value == EA_PID:
             # Heuristic: pick first visible top-level window
             target_hwnd = hwnd
-            # stop enumeration by raising
-            raise StopIteration
-    try:
-        win32gui.EnumWindows(enum_handler, None)
-    except StopIteration:
-        pass
+            return False  # documented way to stop EnumWindows
+        return True
+    # Called through ctypes: pywin32's EnumWindows treats a False return as an error.
+    _user32.EnumWindows(WNDENUMPROC(enum_handler), 0)
     if not target_hwnd:
         print(f'[auto] No window found for PID {EA_PID}.')
         return
@@ -184,12 +309,6 @@ def focus_and_type(code: str):
         print(f'[auto] Could not focus window: {e}')
         return
     time.sleep(0.25)
-    # Send keystrokes
-    try:
-        from pywinauto.keyboard import send_keys
-    except ImportError:
-        print('[auto] pywinauto not installed; cannot send keys.')
-        return
     # Attempt simple: select all, paste code via direct typing.
     send_keys('^a{BACKSPACE}')
     send_keys(code)
@@ -197,65 +316,148 @@ def focus_and_type(code: str):
         send_keys('{ENTER}')
     print(f'[{timestamp()}] AUTO ENTERED (best-effort): {code}')
 
-def handle_code(code: str):
-    first = False
-    with lock:
-        if code not in seen_codes:
-            seen_codes.add(code)
-            first = True
-    if first:
-        copied = copy_to_clipboard(code)
-        status_extra = ' | copied to clipboard' if copied else ''
-        print(f'[{timestamp()}] CODE DETECTED: {code} (new){status_extra}')
-        beep()
-        if AUTO_REDEEM:
+def redeem_worker():
+    while True:
+        code = redeem_queue.get()
+        try:
             focus_and_type(code)
-    else:
+        except Exception as e:
+            print(f'[auto] Auto redeem failed for {code}: {e}')
+        finally:
+            redeem_queue.task_done()
+
+def handle_code(code: str):
+    # Repeats are the common case; an OrderedDict key lookup is a single
+    # C-level dict probe, atomic under the GIL, so check without the lock
+    # first, then double-check before inserting.
+    if code in seen_codes:
         print(f'[{timestamp()}] CODE REPEAT: {code}')
+        return
+    with lock:
+        if code in seen_codes:
+            print(f'[{timestamp()}] CODE REPEAT: {code}')
+            return
+        seen_codes[code] = None
+        if len(seen_codes) > MAX_SEEN_CODES:
+            seen_codes.popitem(last=False)
+    copied = copy_to_clipboard(code)
+    status_extra = ' | copied to clipboard' if copied else ''
+    print(f'[{timestamp()}] CODE DETECTED: {code} (new){status_extra}')
+    beep()
+    if AUTO_REDEEM:
+        redeem_queue.put(code)
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+def _is_code_block(block: str) -> bool:
+    return block.isascii() and block.isalnum()
+
+def _scan_codes(msg: str):
+    """Yield default-pattern codes (XXXX-XXXX-XXXX-XXXX) without the regex engine.
+
+    Equivalent to DEFAULT_CODE_PATTERN with re.IGNORECASE: jumps between
+    hyphens, checks the fixed hyphen positions, then the four alnum blocks
+    and the surrounding word boundaries.
+    """
+    n = len(msg)
+    j = msg.find('-', 4)
+    while j != -1:
+        i = j - 4
+        end = i + 19
+        if (end <= n and msg[i + 9] == '-' and msg[i + 14] == '-'
+                and _is_code_block(msg[i:i + 4]) and _is_code_block(msg[i + 5:i + 9])
+                and _is_code_block(msg[i + 10:i + 14]) and _is_code_block(msg[i + 15:end])
+                and (i == 0 or not _is_word_char(msg[i - 1]))
+                and (end == n or not _is_word_char(msg[end]))):
+            yield msg[i:end].upper()
+            j = msg.find('-', end + 4)
+        else:
+            j = msg.find('-', j + 1)
 
 def process_message(msg: str):
-    for m in code_regex.finditer(msg.upper()):
-        handle_code(m.group(0))
+    # Cheap C-level check first: most chat lines carry no code at all.
+    if PREFILTER_HYPHENS:
+        if msg.count('-') < 3:
+            return
+        for code in _scan_codes(msg):
+            handle_code(code)
+        return
+    for m in code_regex.finditer(msg):
+        handle_code(m.group(0).upper())
+
+_PONG = b'PONG :tmi.twitch.tv\r\n'
+_irc_addrinfo = None  # resolved once; reused by any later connect
+
+def resolve_irc_addr():
+    global _irc_addrinfo
+    if _irc_addrinfo is None:
+        # IPv4 only, as the original socket.socket() default was.
+        _irc_addrinfo = socket.getaddrinfo(HOST, PORT, family=socket.AF_INET,
+                                           type=socket.SOCK_STREAM)[0]
+    return _irc_addrinfo
 
 def send(sock: socket.socket, msg: str):
-    sock.send((msg + '\r\n').encode('utf-8'))
+    sock.sendall((msg + '\r\n').encode('utf-8'))
 
 def main():
     print(f'[{timestamp()}] Connecting to Twitch IRC as {NICK} ...')
+    if AUTO_REDEEM:
+        threading.Thread(target=redeem_worker, name='redeem', daemon=True).start()
     if os.getenv('NO_CONNECT') == '1':
         test_msg = os.getenv('TEST_MESSAGE', 'TEST-CODE-1234-ABCD')
         print(f'[{timestamp()}] NO_CONNECT=1 self-test with message: {test_msg}')
         process_message(test_msg)
+        redeem_queue.join()
         print(f'[{timestamp()}] Self-test complete. Exiting.')
         return
-    with socket.socket() as s:
-        s.connect((HOST, PORT))
-        send(s, f'PASS {TOKEN}')
-        send(s, f'NICK {NICK}')
-        send(s, f'JOIN {CHANNEL}')
+    family, socktype, proto, _, addr = resolve_irc_addr()
+    with socket.socket(family, socktype, proto) as s:
+        # PONGs are tiny; don't let Nagle hold them back. Keepalive spots dead peers.
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        s.connect(addr)
+        # PASS/NICK/JOIN in a single write
+        send(s, f'PASS {TOKEN}\r\nNICK {NICK}\r\nJOIN {CHANNEL}')
         print(f'[{timestamp()}] Joined {CHANNEL}')
-        buf = ''
+        buf = bytearray()
+        start = 0  # offset of the first unconsumed byte in buf
+        # Read straight into a preallocated buffer instead of a new bytes per recv.
+        recv_buf = bytearray(RECV_SIZE)
+        recv_view = memoryview(recv_buf)
         while True:
             try:
-                data = s.recv(4096).decode('utf-8', errors='ignore')
+                n = s.recv_into(recv_view)
             except ConnectionResetError:
                 print(f'[{timestamp()}] Connection reset.')
                 break
-            if not data:
+            if not n:
                 print(f'[{timestamp()}] Disconnected.')
                 break
-            buf += data
-            while '\r\n' in buf:
-                line, buf = buf.split('\r\n', 1)
+            buf += recv_view[:n]
+            # Advance a cursor over complete lines rather than deleting each
+            # one from the front of buf; compact only once per recv.
+            i = buf.find(b'\r\n', start)
+            while i != -1:
+                # Decode only the extracted line; the tail stays as raw bytes.
+                line = buf[start:i].decode('utf-8', errors='ignore')
+                start = i + 2
+                i = buf.find(b'\r\n', start)
                 if not line:
                     continue
                 if line.startswith('PING'):
-                    send(s, 'PONG :tmi.twitch.tv')
-                else:
-                    # Raw IRC line: parse message part after last ':'
-                    parts = line.split(' :', 1)
-                    if len(parts) == 2:
-                        process_message(parts[1])
+                    s.sendall(_PONG)
+                elif ' PRIVMSG ' in line:
+                    # Raw IRC line: ":nick!user@host PRIVMSG #chan :text"
+                    idx = line.find(' :', 1)
+                    if idx != -1:
+                        process_message(line[idx + 2:])
+            if start == len(buf):
+                buf.clear()
+                start = 0
+            elif start > COMPACT_THRESHOLD:
+                del buf[:start]
+                start = 0
 
 if __name__ == '__main__':
     main()
@@ -15,14 +15,61 @@ Usage (PowerShell):
   $env:TWITCH_REFRESH_TOKEN="your_refresh_token"
   python refresh_token.py
 
-This script uses only the standard library (urllib + json). It does not
+This script uses only the standard library (http.client + json). It does not
 automatically update your running environment; you must export the new access
 token yourself (prefixed with oauth: when used for IRC PASS / TWITCH_OAUTH).
+Requests go directly to id.twitch.tv; HTTPS_PROXY is not honored.
 """
 from __future__ import annotations
-import os, json, sys, urllib.request, urllib.parse, time
+import os, json, sys, http.client, urllib.parse, time
 
 TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+_TOKEN_URL_PARTS = urllib.parse.urlsplit(TOKEN_URL)
+
+_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+# Urlencoded client_id/client_secret/grant_type prefix, keyed by credential pair.
+_static_form: tuple[str, str, str] | None = None
+
+def _static_form_prefix(client_id: str, client_secret: str) -> str:
+    global _static_form
+    if _static_form is None or _static_form[:2] != (client_id, client_secret):
+        encoded = urllib.parse.urlencode({
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "grant_type": "refresh_token",
+        })
+        _static_form = (client_id, client_secret, encoded)
+    return _static_form[2]
+
+# Kept open between refresh() calls so repeat refreshes skip the TCP/TLS handshake.
+_conn: http.client.HTTPSConnection | None = None
+
+def _post_form(body: bytes) -> tuple[int, str]:
+    """POST a form body to TOKEN_URL over the shared connection.
+
+    Retries once on a fresh connection only if a reused keep-alive
+    connection turned out to be stale; timeouts and first-connection
+    failures are never retried.
+    """
+    global _conn
+    reused = _conn is not None
+    if _conn is None:
+        _conn = http.client.HTTPSConnection(_TOKEN_URL_PARTS.netloc, timeout=20)
+    try:
+        _conn.request("POST", _TOKEN_URL_PARTS.path, body, _HEADERS)
+        resp = _conn.getresponse()
+        return resp.status, resp.read().decode()
+    except ConnectionError:
+        # Covers RemoteDisconnected, resets, broken pipes and Windows aborts (10053).
+        _conn.close()
+        _conn = None
+        if not reused:
+            raise
+    except Exception:
+        _conn.close()
+        _conn = None
+        raise
+    return _post_form(body)
 
 def err(msg: str):
     print(f"[error] {msg}")
@@ -33,21 +80,15 @@ def refresh():
     client_secret = os.getenv("TWITCH_CLIENT_SECRET") or err("TWITCH_CLIENT_SECRET missing")
     refresh_token = os.getenv("TWITCH_REFRESH_TOKEN") or err("TWITCH_REFRESH_TOKEN missing")
 
-    data = {
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-    }
-    body = urllib.parse.urlencode(data).encode()
-    req = urllib.request.Request(TOKEN_URL, data=body, method="POST")
-    req.add_header("Content-Type", "application/x-www-form-urlencoded")
+    body = (_static_form_prefix(client_id, client_secret) + "&"
+            + urllib.parse.urlencode({"refresh_token": refresh_token})).encode()
     print("[info] Refreshing token ...")
     try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            raw = resp.read().decode()
+        status, raw = _post_form(body)
     except Exception as e:
         err(f"Request failed: {e}")
+    if status != 200:
+        err(f"Request failed: HTTP {status}: {raw[:200]}")
 
     try:
         js = json.loads(raw)